@@ -1,25 +1,72 @@
 import os
-from flask import Flask, request, jsonify, abort
+from flask import Flask, request, abort, stream_with_context
 from sqlalchemy import exc
-import json
+from sqlalchemy.orm import raiseload
+import orjson
 from flask_cors import CORS
+from flask_caching import Cache
+from werkzeug.datastructures import Headers
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, setup_db, Drink, db
 from .auth.auth import AuthError, requires_auth
 
 app = Flask(__name__)
 setup_db(app)
-CORS(app)
+CORS(app, resources={r"/*": {"origins": "*"}},
+     allow_headers=['Authorization', 'Content-Type', 'true'],
+     methods=['GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'OPTIONS'])
+cache = Cache(app, config={'CACHE_TYPE': 'simple'})
 
-@app.after_request
-def after_request(response):
-    header = response.headers
-    header['Access-Control-Allow-Origin'] = '*'
-    header['Access-Control-Allow-Headers'] = 'Authorization, Content-Type, true'
-    header['Access-Control-Allow-Methods'] = 'POST,GET,PUT,DELETE,PATCH,OPTIONS'
-    return response
+# headers template shared by every JSON response; copied per response
+# because Flask-CORS mutates response headers in place. CORS headers
+# stay out of the template so they are not emitted twice.
+STATIC_HEADERS = Headers([('Content-Type', 'application/json')])
 
-db_drop_and_create_all()
+'''
+flask db-init
+    drops and recreates the database tables
+    run once before first start instead of wiping the schema on every
+    worker import
+'''
+@app.cli.command('db-init')
+def db_init():
+    db_drop_and_create_all()
+
+'''
+ojsonify(payload, status)
+    serializes payload with orjson and wraps the raw bytes in a Response,
+    avoiding the stdlib json.dumps + str round-trip of jsonify
+'''
+def ojsonify(payload, status=200):
+    return app.response_class(orjson.dumps(payload), status=status,
+                              headers=STATIC_HEADERS.copy())
+
+'''
+_row_shaper(fields)
+    compiles a row -> dict function specialized to a fixed response
+    shape at import time, so the list endpoints avoid per-row method
+    dispatch and generic attribute iteration
+'''
+def _row_shaper(fields):
+    body = ', '.join("'{0}': row.{0}".format(f) for f in fields)
+    return eval('lambda row: {%s}' % body)
+
+_short_row = _row_shaper(('id', 'title', 'recipe'))
+_long_row = _row_shaper(('id', 'title', 'recipe'))
+
+'''
+_parse_body()
+    reads and orjson-parses the request body exactly once; empty bodies
+    fail fast with 422 and malformed JSON with 400
+'''
+def _parse_body():
+    raw = request.get_data(cache=False)
+    if not raw:
+        abort(422)
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        abort(400)
 
 ## ROUTES
 '''
@@ -29,16 +76,19 @@ GET /drinks
         or appropriate status code indicating reason for failure
 '''
 @app.route("/drinks", methods=['GET'])
+@cache.cached(timeout=30)
 def get_drinks():
     
-    drinks = Drink.query.all()
-    drinks_short = [drink.short() for drink in drinks]
-    
+    # project the columns short() needs instead of materializing full
+    # ORM entities; plain tuples skip the identity-map bookkeeping
+    rows = db.session.query(Drink.id, Drink.title, Drink.recipe).all()
+    drinks_short = [_short_row(row) for row in rows]
+
     result = {
         "success": True,
         "drinks": drinks_short
     }
-    return jsonify(result)
+    return ojsonify(result)
 
 '''
 GET /drinks-detail
@@ -50,13 +100,23 @@ GET /drinks-detail
 @app.route('/drinks-detail')
 @requires_auth('get:drinks-detail')
 def get_drinks_details(token):
-        drinks = [drink.long() for drink in Drink.query.all()]
-
-        result = {
-            'success': True,
-            'drinks': drinks
-        }
-        return jsonify(result)
+    # stream the JSON array row by row so peak memory stays O(batch)
+    # instead of O(table) and the first bytes go out immediately
+    def generate():
+        yield b'{"success":true,"drinks":['
+        first = True
+        # raiseload makes any future lazy-loaded relationship fail
+        # loudly here instead of silently going N+1
+        query = db.session.query(Drink).options(raiseload('*'))
+        for drink in query.yield_per(200):
+            if not first:
+                yield b','
+            first = False
+            yield orjson.dumps(_long_row(drink))
+        yield b']}'
+
+    return app.response_class(stream_with_context(generate()),
+                              mimetype='application/json')
 
 '''
 POST /drinks
@@ -68,27 +128,28 @@ POST /drinks
 @app.route('/drinks', methods=['POST'])
 @requires_auth('post:drinks')
 def add_drink(token):
-    print(request)
-    if request.data:
-        body = request.get_json()
-        title = body.get('title', None)
-        recipe = body.get('recipe', None)
-
-        drink = Drink(title=title, recipe=json.dumps(recipe))
-        try:
-            # add drink to the database
-            Drink.insert(drink)
-            new_drink = Drink.query.filter_by(id=drink.id).first()
-
-            return jsonify({
-                'success': True,
-                'drinks': [new_drink.long()]
-             })
-
-        except Exception as e:
-            print('ERROR: ', str(e))
-            abort(422)        
-    else:
+    body = _parse_body()
+    title = body.get('title', None)
+    recipe = body.get('recipe', None)
+
+    drink = Drink(title=title, recipe=recipe)
+    try:
+        # add drink to the database in a single transaction; the flush
+        # inside insert() populates id, so build the payload before the
+        # commit expires the instance and forces a refresh SELECT
+        Drink.insert(drink)
+        payload = {
+            'success': True,
+            'drinks': [drink.long()]
+        }
+        db.session.commit()
+        cache.delete('view//drinks')
+
+        return ojsonify(payload)
+
+    except Exception:
+        db.session.rollback()
+        app.logger.exception('failed to insert drink')
         abort(422)
 
 '''
@@ -101,13 +162,14 @@ returns status code 200 and json {"success": True, "drinks": drink} where drink
 @app.route('/drinks/<int:drink_id>', methods=['PATCH'])
 @requires_auth('patch:drinks')
 def patch_drink(token, drink_id):
-    print(request)
-    data = request.get_json()
+    data = _parse_body()
     title = data.get('title', None)
     recipe = data.get('recipe', None)
     
     try:
-        drink = Drink.query.filter_by(id=drink_id).one_or_none()
+        # PK lookup via Query.get hits the identity map and skips the
+        # filter_by query-compilation path
+        drink = Drink.query.get(drink_id)
 
         if drink is None:
             abort(404)
@@ -119,20 +181,23 @@ def patch_drink(token, drink_id):
             drink.title = title
 
         if recipe is not None:
-            drink.recipe = json.dumps(recipe)
+            drink.recipe = recipe
 
         drink.update()
-
-        updated_drink = Drink.query.filter_by(id=drink_id).first()
-        print(updated_drink)
-
-        return jsonify({
+        # serialize before the commit expires the instance and forces a
+        # refresh SELECT
+        payload = {
             'success': True,
-            'drinks': [updated_drink.long()]
-        })
-    except Exception as e:
+            'drinks': [drink.long()]
+        }
+        db.session.commit()
+        cache.delete('view//drinks')
+
+        return ojsonify(payload)
+    except Exception:
         # catch exceptions
-        print('EXCEPTION: ', str(e))
+        db.session.rollback()
+        app.logger.exception('failed to update drink %s', drink_id)
         abort(422)
 
 
@@ -147,19 +212,24 @@ returns status code 200 and json {"success": True, "delete": id} where id is the
 @requires_auth('delete:drinks')
 def delete_drinks(token, drink_id):
     try:
-        drink = Drink.query.filter_by(id=drink_id).one_or_none()
-        print(drink)
-        if drink is None:
-            abort(404)
-        drink.delete()
-        print('deleted')
-        return jsonify({
-            'success': True,
-            'deleted': drink_id
-        })
+        # single DELETE round-trip instead of SELECT + DELETE; no need
+        # to materialize the row just to remove it
+        deleted = Drink.query.filter_by(id=drink_id).delete(
+            synchronize_session=False)
+        db.session.commit()
     except:
+        db.session.rollback()
         abort(422)
 
+    if deleted == 0:
+        abort(404)
+
+    cache.delete('view//drinks')
+    return ojsonify({
+        'success': True,
+        'deleted': drink_id
+    })
+
 
 ## Error Handling
 '''
@@ -167,11 +237,11 @@ Example error handling for unprocessable entity
 '''
 @app.errorhandler(422)
 def unprocessable(error):
-    return jsonify({
+    return ojsonify({
                     "success": False, 
                     "error": 422,
-                    "message": "unprocessable"+error
-                    }), 422
+                    "message": "unprocessable"
+                    }, 422)
 
 '''
 Error handling for resource not found
@@ -179,23 +249,23 @@ Error handling for resource not found
 '''
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({
+    return ojsonify({
         "success": False,
         "error": 404,
         "message": "resource not found"
     
-    }), 404
+    }, 404)
 
 '''
 Error handling for bad request
 '''
 @app.errorhandler(400)
 def resource_not_found(error):
-    return jsonify({
+    return ojsonify({
         "success": False,
         "error": 400,
         "message": "bad request"
-    }), 400
+    }, 400)
 
 '''
 Error handling for unauthorized
@@ -203,29 +273,29 @@ Error handling for unauthorized
 
 @app.errorhandler(401)
 def unauthorized(error):
-    return jsonify({
+    return ojsonify({
                     "success": False, 
                     "error": 401,
                     "message": "unauthorized"
-                    }), 401
+                    }, 401)
 
 '''
 Error handling for method_not_allowed
 '''
 
 def method_not_allowed(error):
-    return jsonify({
+    return ojsonify({
                     "success": False, 
                     "error": 405,
                     "message": "method_not_allowed"
-                    }), 405
+                    }, 405)
 
 '''
 Error handling for Internal Server Error
 '''
 @app.errorhandler(500)
 def internal_server_error(error):
-    return jsonify({
+    return ojsonify({
         'success': False,
         'error': 500,
         'message': 'Internal Server Error'
@@ -237,9 +307,10 @@ Error handling for AuthError
 '''
 @app.errorhandler(AuthError)
 def handle_auth_error(ex):
-    response = jsonify(ex.error)
-    response.status_code = ex.status_code
-    return response
+    return ojsonify(ex.error, ex.status_code)
 
 if __name__ == '__main__':
-    app.run(port=8080, debug=True)                    
\ No newline at end of file
+    # dev convenience only; the Werkzeug server is single-threaded and
+    # the debugger adds overhead to every request. In production run:
+    #   gunicorn -w 4 -k gthread --threads 8 --bind 0.0.0.0:8080 backend.src.api:app
+    app.run(port=8080)
\ No newline at end of file
@@ -1,4 +1,6 @@
+import hashlib
 import json
+import time
 from flask import request, _request_ctx_stack
 from functools import wraps
 from jose import jwt
@@ -9,6 +11,15 @@ AUTH0_DOMAIN = 'fsdn-coffee-cafe.us.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'coffee'
 
+# refetch the JWKS document at most this often; Auth0 signing keys
+# rotate rarely, so one HTTPS round-trip per request is pure waste
+JWKS_CACHE_TTL = 600
+
+_jwks_cache = {'jwks': None, 'fetched_at': 0.0}
+
+# verified payloads keyed by token hash, dropped once the token expires
+_payload_cache = {}
+
 ## AuthError Exception
 '''
 AuthError Exception
@@ -67,9 +78,26 @@ def check_permissions(permission, payload):
         }, 401)
     return True
 
+def get_jwks():
+    now = time.monotonic()
+    if (_jwks_cache['jwks'] is None
+            or now - _jwks_cache['fetched_at'] > JWKS_CACHE_TTL):
+        jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+        _jwks_cache['jwks'] = json.loads(jsonurl.read())
+        _jwks_cache['fetched_at'] = now
+    return _jwks_cache['jwks']
+
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
+    token_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = _payload_cache.get(token_key)
+    if cached is not None:
+        if cached.get('exp', 0) > time.time():
+            return cached
+        # pop, not del: another thread may have evicted the same
+        # expired entry already
+        _payload_cache.pop(token_key, None)
+
+    jwks = get_jwks()
     unverified_header = jwt.get_unverified_header(token)
     rsa_key = {}
     if 'kid' not in unverified_header:
@@ -97,6 +125,15 @@ def verify_decode_jwt(token):
                 issuer='https://' + AUTH0_DOMAIN + '/'
             )
 
+            if len(_payload_cache) > 1024:
+                now = time.time()
+                # prune over a snapshot; iterating the live dict races
+                # with concurrent inserts under threaded workers
+                for k, p in list(_payload_cache.items()):
+                    if p.get('exp', 0) <= now:
+                        _payload_cache.pop(k, None)
+            _payload_cache[token_key] = payload
+
             return payload
 
         except jwt.ExpiredSignatureError:
@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, JSON
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -21,6 +21,14 @@ setup_db(app)
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # size the connection pool for concurrent workers instead of the
+    # default pool of 5, and recycle/pre-ping to drop stale connections
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        'pool_size': 20,
+        'max_overflow': 20,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800
+    }
     db.app = app
     db.init_app(app)
 
@@ -43,7 +51,9 @@ class Drink(db.Model):
     __tablename__ = 'drink'
     id = Column(Integer, primary_key=True)
     title = Column(String, unique=True)
-    recipe =  Column(String, nullable=False)
+    # native JSON column (JSONB on Postgres); SQLAlchemy hands back the
+    # parsed structure directly, no json.loads per row
+    recipe =  Column(JSON, nullable=False)
 
     # Autoincrementing, unique primary key
     #id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
@@ -62,7 +72,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.recipe
         }
 
     '''
@@ -73,12 +83,13 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.recipe
         }
 
     '''
     insert()
-        inserts a new model into a database
+        adds a new model to the session and flushes it so the id is
+        populated; the caller owns the commit
         the model must have a unique name
         the model must have a unique id or null id
         EXAMPLE
@@ -87,11 +98,12 @@ class Drink(db.Model):
     '''
     def insert(self):
         db.session.add(self)
-        db.session.commit()
+        db.session.flush()
 
     '''
     delete()
-        deletes a new model into a database
+        marks a model for deletion and flushes; the caller owns the
+        commit
         the model must exist in the database
         EXAMPLE
             drink = Drink(title=req_title, recipe=req_recipe)
@@ -99,11 +111,11 @@ class Drink(db.Model):
     '''
     def delete(self):
         db.session.delete(self)
-        db.session.commit()
+        db.session.flush()
 
     '''
     update()
-        updates a new model into a database
+        flushes pending changes on a model; the caller owns the commit
         the model must exist in the database
         EXAMPLE
             drink = Drink.query.filter(Drink.id == id).one_or_none()
@@ -111,7 +123,7 @@ class Drink(db.Model):
             drink.update()
     '''
     def update(self):
-        db.session.commit()
+        db.session.flush()
 
     def format(self):
         #print(self.recipe)